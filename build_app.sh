@@ -55,6 +55,7 @@ chmod +x "$MACOS/$APP_NAME"
 # Copy app files
 cp "$SCRIPT_DIR/lain_tools.py" "$RESOURCES/"
 cp "$SCRIPT_DIR/lan_scan.py" "$RESOURCES/"
+cp "$SCRIPT_DIR/route_sysctl.py" "$RESOURCES/"
 cp "$SCRIPT_DIR/requirements.txt" "$RESOURCES/"
 [ -f "$SCRIPT_DIR/icon.png" ] && cp "$SCRIPT_DIR/icon.png" "$RESOURCES/"
 
@@ -63,7 +64,7 @@ cp "$SCRIPT_DIR/requirements.txt" "$RESOURCES/"
 echo "Creating venv and installing dependencies..."
 "${SCRIPT_DIR}/venv/bin/python3" -m venv "$RESOURCES/venv"
 "$RESOURCES/venv/bin/pip" install --quiet --upgrade pip
-"$RESOURCES/venv/bin/pip" install --quiet rumps speedtest-cli
+"$RESOURCES/venv/bin/pip" install --quiet rumps speedtest-cli pyobjc-framework-SystemConfiguration
 "$RESOURCES/venv/bin/pip" install --quiet --no-binary psutil psutil
 
 # Info.plist (menu bar app: no Dock icon)
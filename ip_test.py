@@ -1,8 +1,19 @@
+import ipaddress
 import socket
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Queried in parallel; the first valid answer wins
+PUBLIC_IP_URLS = [
+    "https://api.ipify.org",
+    "https://ifconfig.me/ip",
+    "https://4.ipw.cn/",
+]
 
 
 def get_local_ip():
+    # IPv4 only, numeric address and port: no DNS lookup. connect() on a UDP socket sends
+    # nothing; it only picks the route and source address, so it never blocks.
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         s.connect(("8.8.8.8", 80))
@@ -13,11 +24,28 @@ def get_local_ip():
     return local_ip
 
 
-def get_public_ip():
-    url = "https://api.ipify.org"
-    with urllib.request.urlopen(url) as response:
-        public_ip = response.read().decode("utf-8")
-    return public_ip
+def _fetch_ip(url, timeout):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        public_ip = response.read().decode("utf-8").strip()
+    return str(ipaddress.IPv4Address(public_ip))
+
+
+def get_public_ip(timeout=3):
+    ex = ThreadPoolExecutor(max_workers=len(PUBLIC_IP_URLS))
+    futures = [ex.submit(_fetch_ip, url, timeout) for url in PUBLIC_IP_URLS]
+    error = None
+    try:
+        for f in as_completed(futures, timeout=timeout):
+            try:
+                return f.result()
+            except Exception as e:
+                error = e
+    finally:
+        for f in futures:
+            f.cancel()
+        # Don't wait for the slower endpoints
+        ex.shutdown(wait=False)
+    raise error
 
 
 if __name__ == "__main__":
@@ -2,16 +2,38 @@
 macOS menu bar app: shows primary IP in the bar; menu shows all IPs,
 ping (gateway, google), speedtest, and LAN scanner.
 """
+import collections
+import ctypes
+import functools
 import ipaddress
 import os
 import re
+import signal
 import socket
+import struct
 import subprocess
 import sys
+import threading
+import time
 
 import psutil
 import rumps
 
+from route_sysctl import (
+    CTL_NET,
+    NET_RT_DUMP,
+    PF_ROUTE,
+    RT_MSGHDR_SIZE,
+    RTA_DST,
+    RTA_GATEWAY,
+    RTA_NETMASK,
+    RTF_GATEWAY,
+    RTF_IFSCOPE,
+    RTF_UP,
+    libc,
+    sysctl_bytes,
+)
+
 # Smaller menu bar font (optional; requires PyObjC AppKit)
 try:
     from AppKit import NSFont, NSAttributedString, NSFontAttributeName
@@ -20,21 +42,168 @@ try:
 except ImportError:
     _HAVE_APPKIT = False
 
+# Push notifications on network changes (optional; requires PyObjC SystemConfiguration)
+try:
+    from CoreFoundation import CFRunLoopAddSource, CFRunLoopGetMain, kCFRunLoopCommonModes
+    from SystemConfiguration import (
+        SCDynamicStoreCreate,
+        SCDynamicStoreCreateRunLoopSource,
+        SCDynamicStoreSetNotificationKeys,
+    )
+    _HAVE_SYSCONFIG = True
+except ImportError:
+    _HAVE_SYSCONFIG = False
+
+# In-process ICMP ping (optional; requires icmplib), else the ping command is used
+try:
+    from icmplib import ping as _icmp_ping
+    _HAVE_ICMPLIB = True
+except ImportError:
+    _HAVE_ICMPLIB = False
+
 
 # --- IP addresses (primary = highest-priority non-VPN interface, all = every interface) ---
 
 # Interface name prefixes to ignore everywhere (VPN/tunnel, bridge)
 _IGNORED_INTERFACE_PREFIXES = ("utun", "ppp", "ipsec", "bridge")
 
+# "(1) Service Name (Hardware Port: ..., Device: en0)" from networksetup -listnetworkserviceorder
+_SERVICE_RE = re.compile(rb"\(\d+\)\s+(.+?)\s+\([^)]*Device:\s*(\w+)\)")
+# "round-trip min/avg/max/stddev = 1.2/3.4/5.6/0.7 ms" from ping
+_RTT_RE = re.compile(rb"round-trip min/avg/max[^=]*=\s*[\d.]+/([\d.]+)/[\d.]+")
+
 def _is_ignored_interface(iface):
     """True if interface should be ignored (VPN, bridge, etc.)."""
     if not iface:
         return True
-    low = iface.lower()
-    return any(low.startswith(p) for p in _IGNORED_INTERFACE_PREFIXES)
+    return iface.lower().startswith(_IGNORED_INTERFACE_PREFIXES)
+
+
+class _TimedCache:
+    """
+    Caches the result of a zero-argument function for ttl seconds. Thread-safe.
+    invalidate() takes no lock, so it is safe to call from a signal handler while get() is refilling.
+    """
+
+    def __init__(self, func, ttl):
+        self._func = func
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._last_t = 0.0
+        self._value = None
+        self._valid = False
+        self._generation = 0
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if not self._valid or now - self._last_t >= self._ttl:
+                generation = self._generation
+                self._value = self._func()
+                self._last_t = now
+                # An invalidate() during the refill means this value may already be stale
+                self._valid = generation == self._generation
+            return self._value
+
+    def invalidate(self):
+        self._generation += 1
+        self._valid = False
+
+
+# Same fields the code reads from psutil's snicaddr
+_IfAddr = collections.namedtuple("_IfAddr", "family address netmask")
+
+
+class _Ifaddrs(ctypes.Structure):
+    pass
+
+
+_Ifaddrs._fields_ = [
+    ("ifa_next", ctypes.POINTER(_Ifaddrs)),
+    ("ifa_name", ctypes.c_char_p),
+    ("ifa_flags", ctypes.c_uint),
+    ("ifa_addr", ctypes.c_void_p),
+    ("ifa_netmask", ctypes.c_void_p),
+    ("ifa_dstaddr", ctypes.c_void_p),
+    ("ifa_data", ctypes.c_void_p),
+]
+
+
+def _sockaddr_ipv4(ptr):
+    """Dotted quad from a struct sockaddr pointer if it is AF_INET, else None."""
+    if not ptr:
+        return None
+    raw = ctypes.string_at(ptr, 8)
+    # BSD sockaddr starts with sa_len, sa_family (one byte each); Linux has a 16-bit sa_family
+    family = raw[1] if sys.platform == "darwin" else int.from_bytes(raw[0:2], sys.byteorder)
+    if family != socket.AF_INET:
+        return None
+    return socket.inet_ntoa(raw[4:8])
+
+
+def _sockaddr_ipv4_netmask(ptr):
+    """
+    Dotted quad from the netmask sockaddr of an AF_INET address, or None.
+    BSD netmasks can be truncated (short sa_len) and carry family 0, so the family is not
+    checked and bytes past sa_len are taken as zero (as psutil does).
+    """
+    if not ptr:
+        return None
+    if sys.platform == "darwin":
+        sa_len = ctypes.string_at(ptr, 1)[0]
+        raw = ctypes.string_at(ptr, min(sa_len, 8)) if sa_len else b""
+    else:
+        raw = ctypes.string_at(ptr, 8)
+    return socket.inet_ntoa(raw.ljust(8, b"\0")[4:8])
+
+
+def _getifaddrs_ipv4():
+    """IPv4 addresses per interface straight from getifaddrs(3). Returns dict iface -> [_IfAddr]; raises OSError if unavailable."""
+    head = ctypes.POINTER(_Ifaddrs)()
+    if libc().getifaddrs(ctypes.byref(head)) != 0:
+        raise OSError(ctypes.get_errno(), "getifaddrs failed")
+    result = {}
+    try:
+        node = head
+        while node:
+            ifa = node.contents
+            address = _sockaddr_ipv4(ifa.ifa_addr)
+            if address and ifa.ifa_name:
+                netmask = _sockaddr_ipv4_netmask(ifa.ifa_netmask)
+                iface = ifa.ifa_name.decode("utf-8", "replace")
+                result.setdefault(iface, []).append(_IfAddr(socket.AF_INET, address, netmask))
+            node = ifa.ifa_next
+    finally:
+        libc().freeifaddrs(head)
+    return result
+
+
+def _read_if_addrs():
+    """IPv4 addresses per interface via getifaddrs(3); psutil.net_if_addrs() where that is unavailable (e.g. Windows)."""
+    try:
+        return _getifaddrs_ipv4()
+    except (OSError, AttributeError, TypeError):
+        return psutil.net_if_addrs()
+
+
+def _cached_if_addrs():
+    """_read_if_addrs(), cached for slightly less than the 3 s refresh interval."""
+    return _ifaddrs_cache.get()
 
 
 def _service_order_interfaces():
+    """Cached _read_service_order_interfaces(); service order rarely changes, so keep it for a minute."""
+    return _service_order_cache.get()
+
+
+def _invalidate_caches(*_):
+    """Drop all cached lookups so the next refresh is fresh (also the SIGUSR1 handler)."""
+    _ifaddrs_cache.invalidate()
+    _service_order_cache.invalidate()
+    _launch_at_login_cache.invalidate()
+
+
+def _read_service_order_interfaces():
     """
     Get ordered list of (service_name, device) from macOS network service order.
     Skips disabled (*), VPN-like devices, and services whose name contains "VPN".
@@ -43,7 +212,6 @@ def _service_order_interfaces():
     try:
         out = subprocess.check_output(
             ["networksetup", "-listnetworkserviceorder"],
-            text=True,
             timeout=3,
         )
     except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
@@ -52,16 +220,16 @@ def _service_order_interfaces():
     order = []
     for line in out.splitlines():
         line = line.strip()
-        if not line or not line.startswith("("):
+        if not line or not line.startswith(b"("):
             continue
-        disabled = line.startswith("(*)")
+        disabled = line.startswith(b"(*)")
         if disabled:
             continue
-        # (1) Service Name (Hardware Port: ..., Device: en0)
-        match = re.match(r"\(\d+\)\s+(.+?)\s+\([^)]*Device:\s*(\w+)\)", line)
+        match = _SERVICE_RE.match(line)
         if not match:
             continue
-        service_name, device = match.group(1).strip(), match.group(2).strip()
+        service_name = match.group(1).decode("utf-8", "replace").strip()
+        device = match.group(2).decode("ascii", "replace").strip()
         if "vpn" in service_name.lower():
             continue
         if _is_ignored_interface(device):
@@ -74,7 +242,7 @@ def _first_non_vpn_ip_from_psutil():
     """First IPv4 address from a non-ignored interface (by device name), sorted en0, en1, ... for predictability."""
     try:
         items = []
-        for iface, addrs in psutil.net_if_addrs().items():
+        for iface, addrs in _cached_if_addrs().items():
             if _is_ignored_interface(iface):
                 continue
             for addr in addrs:
@@ -97,7 +265,7 @@ def get_primary_ip():
     """
     for _service_name, device in _service_order_interfaces():
         try:
-            addrs = psutil.net_if_addrs().get(device)
+            addrs = _cached_if_addrs().get(device)
             if not addrs:
                 continue
             for addr in addrs:
@@ -123,7 +291,7 @@ def get_all_ips():
     """All IPv4 addresses by interface (bridge etc. ignored). Returns list of (interface_name, address)."""
     result = []
     try:
-        for iface, addrs in psutil.net_if_addrs().items():
+        for iface, addrs in _cached_if_addrs().items():
             if _is_ignored_interface(iface):
                 continue
             for addr in addrs:
@@ -134,18 +302,49 @@ def get_all_ips():
     return result
 
 
+def _primary_first(all_ips, primary):
+    """(interface, address) pairs with the primary address first, each group ordered by interface name."""
+    primary_pairs = []
+    rest = []
+    for pair in all_ips:
+        (primary_pairs if pair[1] == primary else rest).append(pair)
+    primary_pairs.sort()
+    rest.sort()
+    return primary_pairs + rest
+
+
 # --- LAN Scanner: available networks (subnet per interface) ---
 
+def _subnet_from_addrs(addrs):
+    """CIDR string for the first non-loopback IPv4 address (with netmask) in addrs, or None."""
+    for addr in addrs:
+        if addr.family == socket.AF_INET and addr.address and addr.netmask and not addr.address.startswith("127."):
+            return str(ipaddress.ip_interface(f"{addr.address}/{addr.netmask}").network)
+    return None
+
+
+def _compute_subnets_once():
+    """Single pass over all non-ignored interfaces. Returns dict device -> CIDR string."""
+    subnets = {}
+    try:
+        for iface, addrs in _cached_if_addrs().items():
+            if _is_ignored_interface(iface):
+                continue
+            cidr = _subnet_from_addrs(addrs)
+            if cidr:
+                subnets[iface] = cidr
+    except Exception:
+        pass
+    return subnets
+
+
 def get_subnet_for_device(device):
     """Return CIDR string (e.g. '192.168.1.0/24') for device, or None."""
     try:
-        addrs = psutil.net_if_addrs().get(device)
+        addrs = _cached_if_addrs().get(device)
         if not addrs:
             return None
-        for addr in addrs:
-            if addr.family == socket.AF_INET and addr.address and addr.netmask and not addr.address.startswith("127."):
-                net = ipaddress.IPv4Network(f"{addr.address}/{addr.netmask}", strict=False)
-                return str(net)
+        return _subnet_from_addrs(addrs)
     except Exception:
         pass
     return None
@@ -161,22 +360,18 @@ def get_available_networks():
     for service_name, device in _service_order_interfaces():
         if device not in device_to_name:
             device_to_name[device] = service_name
+    subnets = _compute_subnets_once()
     seen_cidrs = set()
     result = []
-    for device, name in sorted(device_to_name.items(), key=lambda x: x[0]):
-        cidr = get_subnet_for_device(device)
+    # Named services first, then any remaining interfaces; both ordered by device name
+    ordered = sorted(device_to_name.items()) + [
+        (iface, iface) for iface in sorted(subnets) if iface not in device_to_name
+    ]
+    for device, name in ordered:
+        cidr = subnets.get(device)
         if cidr and cidr not in seen_cidrs:
             seen_cidrs.add(cidr)
             result.append((name, cidr))
-    for iface, addrs in sorted(psutil.net_if_addrs().items()):
-        if _is_ignored_interface(iface):
-            continue
-        if iface in device_to_name:
-            continue
-        cidr = get_subnet_for_device(iface)
-        if cidr and cidr not in seen_cidrs:
-            seen_cidrs.add(cidr)
-            result.append((iface, cidr))
     return result
 
 
@@ -187,6 +382,7 @@ _LAN_SCAN_SCRIPT = os.path.join(_APP_DIR, "lan_scan.py")
 _ICON_PATH = os.path.join(_APP_DIR, "icon.png")
 
 
+@functools.lru_cache(maxsize=1)
 def _get_app_bundle_path():
     """If running from inside an .app bundle, return the path to the .app; else None."""
     path = os.path.abspath(__file__)
@@ -202,6 +398,11 @@ def _get_app_bundle_path():
 
 
 def _launch_at_login_enabled():
+    """True if this app is in the user's Login Items (cached for 30 s; osascript is slow)."""
+    return _launch_at_login_cache.get()
+
+
+def _read_launch_at_login_enabled():
     """True if this app is in the user's Login Items."""
     app_path = _get_app_bundle_path()
     if not app_path:
@@ -237,6 +438,43 @@ def _set_launch_at_login(enabled):
         return False
 
 
+# Lookups repeated on every menu refresh that shell out or enumerate interfaces
+_ifaddrs_cache = _TimedCache(_read_if_addrs, 2.5)
+_service_order_cache = _TimedCache(_read_service_order_interfaces, 60.0)
+_launch_at_login_cache = _TimedCache(_read_launch_at_login_enabled, 30.0)
+
+
+# --- Network change notifications ---
+
+# Primary service / service order, and per-interface IPv4 configuration
+_NETWORK_NOTIFICATION_KEYS = ["State:/Network/Global/IPv4", "Setup:/Network/Global/IPv4"]
+_NETWORK_NOTIFICATION_PATTERNS = [r"State:/Network/Interface/.*/IPv4"]
+
+
+def _watch_network_changes(on_change):
+    """
+    Call on_change() on the main run loop whenever IPv4 configuration changes.
+    Returns an opaque handle that must be kept alive, or None if unavailable.
+    """
+    if not _HAVE_SYSCONFIG:
+        return None
+
+    def callback(_store, _changed_keys, _info):
+        on_change()
+
+    try:
+        store = SCDynamicStoreCreate(None, "LAIN-tools", callback, None)
+        if store is None:
+            return None
+        if not SCDynamicStoreSetNotificationKeys(store, _NETWORK_NOTIFICATION_KEYS, _NETWORK_NOTIFICATION_PATTERNS):
+            return None
+        source = SCDynamicStoreCreateRunLoopSource(None, store, 0)
+        CFRunLoopAddSource(CFRunLoopGetMain(), source, kCFRunLoopCommonModes)
+        return store, source, callback
+    except Exception:
+        return None
+
+
 # --- Open Terminal and run a command ---
 
 def run_in_terminal(command):
@@ -256,8 +494,49 @@ def run_in_terminal(command):
 
 # --- Default gateway ---
 
+def _default_gateway_from_dump(data):
+    """Gateway of the IPv4 default route in a NET_RT_DUMP buffer; prefers the unscoped route like `route get default`."""
+    scoped = None
+    offset = 0
+    while offset + RT_MSGHDR_SIZE <= len(data):
+        msglen, _version, _type, _index, flags, addrs = struct.unpack_from("=HBBHxxii", data, offset)
+        if msglen == 0:
+            break
+        end = offset + msglen
+        if flags & (RTF_UP | RTF_GATEWAY) == RTF_UP | RTF_GATEWAY:
+            # Sockaddrs follow in RTA_* bit order, each padded to 4 bytes
+            sockaddrs = {}
+            pos = offset + RT_MSGHDR_SIZE
+            for bit in (RTA_DST, RTA_GATEWAY, RTA_NETMASK):
+                if not addrs & bit:
+                    continue
+                sa_len = data[pos] if pos < end else 0
+                sockaddrs[bit] = data[pos:pos + sa_len]
+                pos += (sa_len + 3) & ~3 if sa_len else 4
+            dst, gw = sockaddrs.get(RTA_DST, b""), sockaddrs.get(RTA_GATEWAY, b"")
+            mask = sockaddrs.get(RTA_NETMASK, b"")
+            is_default = len(dst) >= 8 and dst[1] == socket.AF_INET and dst[4:8] == b"\0\0\0\0" and not any(mask[4:])
+            if is_default and len(gw) >= 8 and gw[1] == socket.AF_INET:
+                gateway = socket.inet_ntoa(gw[4:8])
+                if not flags & RTF_IFSCOPE:
+                    return gateway
+                scoped = scoped or gateway
+        offset = end
+    return scoped
+
+
 def get_gateway():
     """Default gateway IP (macOS)."""
+    if sys.platform == "darwin":
+        data = sysctl_bytes([CTL_NET, PF_ROUTE, 0, socket.AF_INET, NET_RT_DUMP, 0])
+        if data is not None:
+            try:
+                gateway = _default_gateway_from_dump(data)
+                if gateway:
+                    return gateway
+            except (IndexError, struct.error, OSError):
+                pass
+    # Fall back to parsing route(8) output
     try:
         out = subprocess.check_output(
             ["route", "-n", "get", "default"],
@@ -279,19 +558,26 @@ def ping_host(host, count=3):
     """Ping host. Returns (success: bool, message: str)."""
     if not host:
         return False, "No host"
+    if _HAVE_ICMPLIB:
+        try:
+            r = _icmp_ping(host, count=count, timeout=1, privileged=False)
+            if not r.is_alive:
+                return False, "Request timeout or unreachable"
+            return True, f"OK — {r.avg_rtt:.1f} ms avg"
+        except Exception:
+            pass  # e.g. unprivileged ICMP not permitted; fall back to the ping command
     try:
         out = subprocess.run(
             ["ping", "-c", str(count), "-t", "3", host],
             capture_output=True,
-            text=True,
             timeout=count * 3 + 2,
         )
         if out.returncode != 0:
             return False, "Request timeout or unreachable"
         # Parse approximate RTT from last line: "round-trip min/avg/max = ..."
-        match = re.search(r"round-trip min/avg/max[^=]*=\s*[\d.]+/([\d.]+)/[\d.]+", out.stdout)
+        match = _RTT_RE.search(out.stdout)
         if match:
-            return True, f"OK — {match.group(1)} ms avg"
+            return True, f"OK — {match.group(1).decode('ascii')} ms avg"
         return True, "OK"
     except subprocess.TimeoutExpired:
         return False, "Timeout"
@@ -309,9 +595,13 @@ class NetStatusApp(rumps.App):
         else:
             super().__init__("LAIN-tools", title="…", quit_button=None)
         self._use_icon = use_icon
+        # What the menu was last built from; rebuild only when this changes
+        self._last_snapshot = None
 
-        # Refresh primary IP and menu (including IP list) every few seconds
-        self._timer = rumps.Timer(self._update_title, 3.0)
+        # Refresh primary IP and menu on network changes; the timer is a safety net when
+        # notifications are available, otherwise it polls every few seconds
+        self._network_watch = _watch_network_changes(self._on_network_change)
+        self._timer = rumps.Timer(self._update_title, 60.0 if self._network_watch else 3.0)
         self._timer.start()
 
         self._update_title(None)
@@ -320,7 +610,7 @@ class NetStatusApp(rumps.App):
         """Build menu with all IPs as non-clickable items at top, then actions."""
         primary = get_primary_ip()
         all_ips = get_all_ips()
-        sorted_ips = sorted(all_ips, key=lambda x: (x[1] != primary, x[0]))
+        sorted_ips = _primary_first(all_ips, primary)
         ip_items = [
             rumps.MenuItem(f"  {iface}: {addr}", callback=None)
             for iface, addr in sorted_ips
@@ -342,6 +632,7 @@ class NetStatusApp(rumps.App):
         menu_parts = ip_items + [
             rumps.separator,
             rumps.MenuItem("All IP addresses", callback=self.show_all_ips),
+            rumps.MenuItem("Refresh", callback=self.refresh),
             rumps.separator,
             rumps.MenuItem("Ping gateway", callback=self.ping_gateway),
             rumps.MenuItem("Ping google.com", callback=self.ping_google),
@@ -360,9 +651,19 @@ class NetStatusApp(rumps.App):
         ])
         return menu_parts
 
+    def _on_network_change(self):
+        # Login Items are unrelated to network state; keep that cache (osascript is slow)
+        _ifaddrs_cache.invalidate()
+        _service_order_cache.invalidate()
+        self._update_title(None)
+
+    def _menu_snapshot(self, primary):
+        launch_state = _launch_at_login_enabled() if _get_app_bundle_path() else None
+        return (primary, tuple(sorted(get_all_ips())), tuple(get_available_networks()), launch_state)
+
     def _update_title(self, _):
+        primary = get_primary_ip()
         if not self._use_icon:
-            primary = get_primary_ip()
             title_text = primary if primary else "No network"
             self.title = title_text
             if _HAVE_APPKIT:
@@ -375,24 +676,36 @@ class NetStatusApp(rumps.App):
                     nsitem.setAttributedTitle_(attr)
                 except Exception:
                     pass
-        # Refresh dropdown menu so IP list is up to date
+        # Refresh dropdown menu only when the IP list, networks or Login Items state changed
         try:
+            snapshot = self._menu_snapshot(primary)
+            if snapshot == self._last_snapshot:
+                return
             self._menu.clear()
             self.menu = self._build_menu()
+            self._last_snapshot = snapshot
         except Exception:
             pass
 
     @rumps.clicked("All IP addresses")
     def show_all_ips(self, _):
+        _invalidate_caches()
         all_ips = get_all_ips()
         primary = get_primary_ip()
         lines = []
-        for iface, addr in sorted(all_ips, key=lambda x: (x[1] != primary, x[0])):
+        for iface, addr in _primary_first(all_ips, primary):
             mark = " (primary)" if addr == primary else ""
             lines.append(f"  {iface}: {addr}{mark}")
         text = "\n".join(lines) if lines else "No addresses found."
         rumps.alert("All IP addresses", text)
 
+    @rumps.clicked("Refresh")
+    def refresh(self, _):
+        """Re-read interfaces, service order and Login Items now instead of waiting for the caches."""
+        _invalidate_caches()
+        self._last_snapshot = None
+        self._update_title(None)
+
     @rumps.clicked("Ping gateway")
     def ping_gateway(self, _):
         gw = get_gateway()
@@ -418,8 +731,12 @@ class NetStatusApp(rumps.App):
         run_in_terminal(f'bash -c \'"{python_exe}" "{script}" {cidr}{ports_arg}; echo; read -p "Press Enter to close..."\'')
 
     def _toggle_launch_at_login(self, _):
+        # Login Items may have been changed in System Settings since the cached read
+        _launch_at_login_cache.invalidate()
         currently = _launch_at_login_enabled()
         if _set_launch_at_login(not currently):
+            _launch_at_login_cache.invalidate()
+            self._update_title(None)
             rumps.notification(
                 "LAIN-tools",
                 "Launch at Login",
@@ -428,4 +745,6 @@ class NetStatusApp(rumps.App):
 
 
 if __name__ == "__main__":
+    # `kill -USR1 <pid>` forces fresh lookups on the next refresh
+    signal.signal(signal.SIGUSR1, _invalidate_caches)
     NetStatusApp().run()
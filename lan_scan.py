@@ -1,20 +1,42 @@
 #!/usr/bin/env python3
 """
-Ping-sweep a subnet; print IP + MAC + hostname, or IP + MAC + open ports (--ports).
+ICMP-sweep a subnet; print IP + MAC + hostname, or IP + MAC + open ports (--ports).
 Usage: python lan_scan.py <CIDR> [--ports]
 Example: python lan_scan.py 192.168.1.0/24
          python lan_scan.py 192.168.1.0/24 --ports
 """
+import asyncio
+import errno
 import ipaddress
+import os
 import re
 import socket
+import struct
 import subprocess
 import sys
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from route_sysctl import CTL_NET, NET_RT_FLAGS, PF_ROUTE, RT_MSGHDR_SIZE, RTF_LLINFO, sysctl_bytes
+
+# Concurrent reverse DNS on one UDP socket (optional; requires aiodns)
+try:
+    import aiodns
+    _HAVE_AIODNS = True
+except ImportError:
+    _HAVE_AIODNS = False
+
+# File-descriptor limit, to size the port-scan concurrency (not available on Windows)
+try:
+    import resource
+except ImportError:
+    resource = None
+
 HOSTNAME_TIMEOUT = 2
 
+# ARP line: IP (with or without parens) and "at" MAC (hex:hex:...)
+_ARP_RE = re.compile(rb"\(?(\d+\.\d+\.\d+\.\d+)\)?\s+at\s+([0-9a-fA-F:]+)")
+
 # Common TCP ports to scan when --ports
 COMMON_PORTS = [
     21, 22, 23, 80, 443, 445, 631, 3306, 3389, 5353, 8080, 9100, 62078,
@@ -33,25 +55,222 @@ def ping(ip, timeout=1):
         return False
 
 
+# Resends per host while the ICMP send buffer is full (10 ms apart)
+_SEND_RETRIES = 50
+
+
+def _icmp_checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _echo_request(ident, seq):
+    payload = b"lain-tools"
+    header = struct.pack("!BBHHH", 8, 0, 0, ident, seq)
+    checksum = _icmp_checksum(header + payload)
+    return struct.pack("!BBHHH", 8, 0, checksum, ident, seq) + payload
+
+
+def _open_icmp_socket():
+    """ICMP socket: unprivileged datagram (macOS, most Linux) or raw (root). Raises OSError."""
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+    except OSError:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+
+
+def host_range(net):
+    """Host addresses of net as a range of ints (same hosts as net.hosts(), without building objects)."""
+    first, last = int(net.network_address), int(net.broadcast_address)
+    if net.prefixlen < 31:
+        first, last = first + 1, last - 1
+    return range(first, last + 1)
+
+
+def _int_to_ip(n):
+    return socket.inet_ntoa(n.to_bytes(4, "big"))
+
+
+def _ip_to_int(ip_str):
+    return int.from_bytes(socket.inet_aton(ip_str), "big")
+
+
+async def sweep(hosts, timeout=1):
+    """
+    Send one ICMP echo to every host (a range from host_range) from a single socket and collect replies.
+    Returns list of IPv4Address that answered within timeout seconds of the last send.
+    Raises OSError if no ICMP socket can be opened.
+    """
+    loop = asyncio.get_running_loop()
+    sock = _open_icmp_socket()
+    seen = set()
+    alive = []
+    all_answered = loop.create_future()
+
+    def on_readable():
+        while True:
+            try:
+                data, addr = sock.recvfrom(1024)
+            except OSError:
+                return
+            # Raw sockets (and datagram ICMP on macOS) include the IP header
+            if data and data[0] >> 4 == 4:
+                data = data[(data[0] & 0x0F) * 4:]
+            if not data or data[0] != 0:  # not an echo reply
+                continue
+            n = _ip_to_int(addr[0])
+            if n in hosts and n not in seen:
+                seen.add(n)
+                alive.append(ipaddress.IPv4Address(n))
+                if len(seen) == len(hosts) and not all_answered.done():
+                    all_answered.set_result(None)
+
+    try:
+        sock.setblocking(False)
+        loop.add_reader(sock.fileno(), on_readable)
+        ident = os.getpid() & 0xFFFF
+        for seq, n in enumerate(hosts):
+            packet = _echo_request(ident, seq & 0xFFFF)
+            for _ in range(_SEND_RETRIES):
+                try:
+                    sock.sendto(packet, (_int_to_ip(n), 0))
+                    break
+                except OSError as e:
+                    # Full send buffer (macOS reports ENOBUFS on bursts): let it drain and resend
+                    if isinstance(e, BlockingIOError) or e.errno == errno.ENOBUFS:
+                        await asyncio.sleep(0.01)
+                        continue
+                    # Unreachable/not permitted for this host only; skip it
+                    break
+            # Buffer never drained (e.g. link went down): the host is skipped
+        try:
+            await asyncio.wait_for(all_answered, timeout)
+        except asyncio.TimeoutError:
+            pass
+    finally:
+        loop.remove_reader(sock.fileno())
+        sock.close()
+    return alive
+
+
+def fping_sweep(hosts, timeout=1):
+    """Batch ping via a single fping process. Returns list of IPv4Address that answered, or None if fping is unavailable or failed."""
+    try:
+        r = subprocess.run(
+            ["fping", "-a", "-r", "0", "-t", str(int(timeout * 1000))],
+            input="\n".join(map(_int_to_ip, hosts)),
+            capture_output=True,
+            text=True,
+            timeout=timeout + len(hosts) * 0.01 + 5,
+        )
+    except Exception:
+        return None
+    # 1 just means some hosts were unreachable; anything else (e.g. 4, no ICMP socket) means fping failed
+    if r.returncode not in (0, 1):
+        return None
+    found = []
+    for line in r.stdout.splitlines():
+        try:
+            ip = ipaddress.IPv4Address(line.strip())
+        except ValueError:
+            continue
+        if int(ip) in hosts:
+            found.append(ip)
+    return found
+
+
+def find_live_hosts(hosts, executor):
+    """ICMP sweep from one socket; falls back to fping, then to one ping process per host on executor."""
+    try:
+        return asyncio.run(sweep(hosts))
+    except OSError:
+        pass
+    found = fping_sweep(hosts)
+    if found is not None:
+        return found
+    found = []
+    futures = {executor.submit(ping, _int_to_ip(n)): ipaddress.IPv4Address(n) for n in hosts}
+    for f in as_completed(futures):
+        if f.result():
+            found.append(futures[f])
+    return found
+
+
+def _parse_arp_line(line):
+    """
+    (ip, mac) bytes from one ARP line, or None. Slices around b" at " directly;
+    uses _ARP_RE only for lines that do not fit the usual "(ip) at mac ..." shape.
+    """
+    at = line.find(b" at ")
+    if at > 0:
+        ip_end = at - 1 if line[at - 1] == 0x29 else at  # ")"
+        ip = line[line.rfind(b" ", 0, ip_end) + 1:ip_end].lstrip(b"(")
+        mac_end = line.find(b" ", at + 4)
+        mac = line[at + 4:mac_end if mac_end >= 0 else len(line)]
+        if ip.count(b".") == 3 and mac.count(b":") == 5:
+            try:
+                socket.inet_aton(ip.decode("ascii"))
+                int(mac.replace(b":", b""), 16)
+                return ip, mac
+            except (OSError, ValueError, UnicodeDecodeError):
+                pass
+    match = _ARP_RE.search(line)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def _parse_arp_dump(data):
+    """dict ip -> mac from a NET_RT_FLAGS/RTF_LLINFO dump: rt_msghdr, sockaddr_inarp, sockaddr_dl per entry."""
+    result = {}
+    offset = 0
+    while offset + RT_MSGHDR_SIZE <= len(data):
+        (msglen,) = struct.unpack_from("=H", data, offset)
+        if msglen == 0:
+            break
+        sin = offset + RT_MSGHDR_SIZE
+        sin_len = data[sin]
+        ip_str = socket.inet_ntoa(data[sin + 4:sin + 8])
+        # sockaddr_dl follows, 4-byte aligned: len, family, index(2), type, nlen, alen, slen, data...
+        sdl = sin + ((sin_len + 3) & ~3 if sin_len else 4)
+        if sdl + 8 <= offset + msglen:
+            nlen, alen = data[sdl + 5], data[sdl + 6]
+            lladdr = data[sdl + 8 + nlen:sdl + 8 + nlen + alen]
+            if alen == 6 and len(lladdr) == 6:  # alen 0 is "(incomplete)"
+                result[ip_str] = ":".join(f"{b:02x}" for b in lladdr)
+        offset += msglen
+    return result
+
+
 def get_arp_table():
     """Return dict ip -> mac from macOS ARP table. MACs normalized to lowercase with leading zeros."""
+    if sys.platform == "darwin":
+        data = sysctl_bytes([CTL_NET, PF_ROUTE, 0, socket.AF_INET, NET_RT_FLAGS, RTF_LLINFO])
+        if data is not None:
+            try:
+                return _parse_arp_dump(data)
+            except (IndexError, struct.error, OSError):
+                pass
+    # Fall back to parsing arp(8) output
     result = {}
     try:
         # -n: numeric (no DNS), often more consistent output
-        out = subprocess.check_output(["arp", "-an"], text=True, timeout=5)
+        out = subprocess.check_output(["arp", "-an"], timeout=5)
     except Exception:
         try:
-            out = subprocess.check_output(["arp", "-a"], text=True, timeout=5)
+            out = subprocess.check_output(["arp", "-a"], timeout=5)
         except Exception:
             return result
     # macOS: "(192.168.1.1) at aa:bb:cc:dd:ee:ff on en0" or "192.168.1.1 at 1:2:3:4:5:6 on en0"
-    # Match IP (with or without parens) and "at" MAC (hex:hex:...)
+    # Parsed as bytes; only the captured IP and MAC are decoded
     for line in out.splitlines():
-        match = re.search(r"\(?([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)\)?\s+at\s+([0-9a-fA-F:]+)", line)
-        if match:
-            ip_str, mac = match.group(1), match.group(2)
-            if "incomplete" in line.lower():
+        pair = _parse_arp_line(line)
+        if pair:
+            if b"incomplete" in line.lower():
                 continue
+            ip_str, mac = pair[0].decode("ascii"), pair[1].decode("ascii")
             parts = mac.split(":")
             if len(parts) == 6:
                 mac = ":".join(p.zfill(2) for p in parts).lower()
@@ -59,6 +278,17 @@ def get_arp_table():
     return result
 
 
+def wait_for_arp(found, attempts=4, interval=0.15):
+    """ARP table once every found host has an entry, or after attempts reads (the kernel fills it asynchronously)."""
+    for attempt in range(attempts):
+        arp = get_arp_table()
+        if all(str(ip) in arp for ip in found):
+            break
+        if attempt < attempts - 1:
+            time.sleep(interval)
+    return arp
+
+
 def get_hostname(ip):
     """Return hostname for IP, or None. Uses reverse DNS / mDNS."""
     try:
@@ -68,24 +298,108 @@ def get_hostname(ip):
         return None
 
 
-def check_port(ip, port, timeout=0.5):
+async def _resolve_one(resolver, ip, executor):
+    if resolver is not None:
+        try:
+            result = await asyncio.wait_for(resolver.gethostbyaddr(str(ip)), HOSTNAME_TIMEOUT)
+            if result.name:
+                return result.name
+        except Exception:
+            pass
+    # System resolver also covers mDNS (.local) names that plain DNS does not answer
+    loop = asyncio.get_running_loop()
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(timeout)
-        s.connect((str(ip), port))
-        s.close()
-        return True
+        return await asyncio.wait_for(loop.run_in_executor(executor, get_hostname, ip), HOSTNAME_TIMEOUT)
     except Exception:
-        return False
+        return None
+
+
+async def resolve_all(found, on_result, executor=None):
+    """
+    Reverse-resolve every host concurrently (system-resolver lookups run on executor).
+    Calls on_result(ip, hostname or None) as each lookup finishes.
+    """
+    resolver = aiodns.DNSResolver(timeout=HOSTNAME_TIMEOUT) if _HAVE_AIODNS else None
+
+    async def resolve_host(ip):
+        try:
+            return ip, await _resolve_one(resolver, ip, executor)
+        except Exception:
+            return ip, None
+
+    for next_done in asyncio.as_completed([resolve_host(ip) for ip in found]):
+        on_result(*(await next_done))
 
 
-def scan_ports(ip):
-    """Return sorted list of open port numbers."""
-    open_ports = []
-    for port in COMMON_PORTS:
-        if check_port(ip, port):
-            open_ports.append(port)
-    return sorted(open_ports)
+# Headroom for stdio, the executor, resolver sockets, etc.
+_FD_HEADROOM = 64
+# Connect attempts per port while out of file descriptors (50 ms apart)
+_FD_RETRIES = 40
+
+
+def _port_scan_limit(wanted):
+    """
+    Concurrent connections that fit under RLIMIT_NOFILE (Terminal's default soft limit is 256).
+    Raises the soft limit toward the hard limit first when that allows more.
+    """
+    if resource is None:
+        return wanted
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        needed = wanted + _FD_HEADROOM
+        if soft != resource.RLIM_INFINITY and soft < needed:
+            new_soft = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+            try:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+                soft = new_soft
+            except (ValueError, OSError):
+                pass
+        if soft == resource.RLIM_INFINITY:
+            return wanted
+        return max(1, min(wanted, soft - _FD_HEADROOM))
+    except (ValueError, OSError):
+        return wanted
+
+
+async def try_port(ip, port, sem, timeout=0.5):
+    """True if a TCP connection to ip:port succeeds within timeout."""
+    async with sem:
+        for _ in range(_FD_RETRIES):
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(str(ip), port), timeout)
+                break
+            except OSError as e:
+                # Out of file descriptors says nothing about the port; wait for others to close
+                if e.errno in (errno.EMFILE, errno.ENFILE):
+                    await asyncio.sleep(0.05)
+                    continue
+                return False
+            except Exception:
+                return False
+        else:
+            # Descriptors never freed up; give up on this port
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+        return True
+
+
+async def scan_all(found, on_result, limit=500):
+    """
+    Probe COMMON_PORTS on every host concurrently.
+    Calls on_result(ip, sorted list of open ports) as each host finishes.
+    """
+    sem = asyncio.Semaphore(_port_scan_limit(limit))
+
+    async def scan_host(ip):
+        results = await asyncio.gather(*(try_port(ip, port, sem) for port in COMMON_PORTS))
+        return ip, sorted(port for port, is_open in zip(COMMON_PORTS, results) if is_open)
+
+    for next_done in asyncio.as_completed([scan_host(ip) for ip in found]):
+        on_result(*(await next_done))
 
 
 def main():
@@ -104,59 +418,37 @@ def main():
     except ValueError as e:
         print(f"Invalid CIDR: {e}")
         sys.exit(1)
-    hosts = list(net.hosts())
+    hosts = host_range(net)
     if not hosts:
         print("No hosts in subnet")
         return
     print(f"Scanning {net} ({len(hosts)} hosts)" + (" — port scan" if do_ports else "") + "...")
     print()
-    found = []
+    # One pool for both phases: ping fallback, then system-resolver hostname lookups
     with ThreadPoolExecutor(max_workers=60) as ex:
-        futures = {ex.submit(ping, ip): ip for ip in hosts}
-        for f in as_completed(futures):
-            if f.result():
-                found.append(futures[f])
-    if not found:
-        print("No hosts responded.")
-        return
-    # Give the kernel a moment to fill the ARP table after pings
-    time.sleep(1)
-    arp = get_arp_table()
-    if do_ports:
-        results = []
-        with ThreadPoolExecutor(max_workers=20) as ex:
-            port_futures = {ex.submit(scan_ports, ip): ip for ip in found}
-            for f in as_completed(port_futures):
-                ip = port_futures[f]
-                try:
-                    open_ports = f.result()
-                except Exception:
-                    open_ports = []
-                mac = arp.get(str(ip), "")
-                results.append((ip, mac, open_ports))
-        results.sort(key=lambda x: x[0])
-        print(f"{'IP':<16} {'MAC':<18} {'Open ports'}")
-        print("-" * 60)
-        for ip, mac, open_ports in results:
-            ports_str = ", ".join(str(p) for p in open_ports) if open_ports else "—"
-            print(f"{str(ip):<16} {mac:<18} {ports_str}")
-    else:
-        results = []
-        with ThreadPoolExecutor(max_workers=30) as ex:
-            hostname_futures = {ex.submit(get_hostname, ip): ip for ip in found}
-            for f in as_completed(hostname_futures):
-                ip = hostname_futures[f]
-                try:
-                    hostname = f.result(timeout=HOSTNAME_TIMEOUT)
-                except Exception:
-                    hostname = None
-                mac = arp.get(str(ip), "")
-                results.append((ip, mac, hostname or "—"))
-        results.sort(key=lambda x: x[0])
-        print(f"{'IP':<16} {'MAC':<18} {'Hostname'}")
-        print("-" * 60)
-        for ip, mac, hostname in results:
-            print(f"{str(ip):<16} {mac:<18} {hostname}")
+        found = find_live_hosts(hosts, ex)
+        if not found:
+            print("No hosts responded.")
+            return
+        arp = wait_for_arp(found)
+        # Rows are printed as each host finishes, so they are not in IP order
+        if do_ports:
+            print(f"{'IP':<16} {'MAC':<18} {'Open ports'}")
+            print("-" * 60)
+
+            def print_ports(ip, open_ports):
+                ports_str = ", ".join(str(p) for p in open_ports) if open_ports else "—"
+                print(f"{str(ip):<16} {arp.get(str(ip), ''):<18} {ports_str}", flush=True)
+
+            asyncio.run(scan_all(found, print_ports))
+        else:
+            print(f"{'IP':<16} {'MAC':<18} {'Hostname'}")
+            print("-" * 60)
+
+            def print_hostname(ip, hostname):
+                print(f"{str(ip):<16} {arp.get(str(ip), ''):<18} {hostname or '—'}", flush=True)
+
+            asyncio.run(resolve_all(found, print_hostname, ex))
     print()
     print(f"Done. {len(found)} host(s) responded.")
 
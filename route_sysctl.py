@@ -0,0 +1,47 @@
+"""
+Shared libc / routing-table sysctl helpers for lain_tools.py and lan_scan.py (macOS).
+"""
+import ctypes
+import ctypes.util
+import functools
+
+# <sys/sysctl.h>, <sys/socket.h>
+CTL_NET = 4
+PF_ROUTE = 17
+NET_RT_DUMP = 1
+NET_RT_FLAGS = 2
+
+# <net/route.h>
+RT_MSGHDR_SIZE = 92  # struct rt_msghdr, including struct rt_metrics
+RTF_UP = 0x1
+RTF_GATEWAY = 0x2
+RTF_LLINFO = 0x400
+RTF_IFSCOPE = 0x1000000
+RTA_DST = 0x1
+RTA_GATEWAY = 0x2
+RTA_NETMASK = 0x4
+
+
+@functools.lru_cache(maxsize=1)
+def libc():
+    """The C library, loaded once (find_library can spawn subprocesses on Linux)."""
+    return ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+
+def sysctl_bytes(mib):
+    """Raw bytes returned by sysctl(3) for the given MIB, or None."""
+    try:
+        lib = libc()
+        mib_arr = (ctypes.c_int * len(mib))(*mib)
+        for _ in range(3):
+            size = ctypes.c_size_t(0)
+            if lib.sysctl(mib_arr, len(mib), None, ctypes.byref(size), None, 0) != 0:
+                return None
+            # Table can grow between the size query and the read
+            size.value += size.value // 4 + 512
+            buf = ctypes.create_string_buffer(size.value)
+            if lib.sysctl(mib_arr, len(mib), buf, ctypes.byref(size), None, 0) == 0:
+                return buf.raw[:size.value]
+        return None
+    except Exception:
+        return None